@@ -1,19 +1,36 @@
 # app.py
 # Safe Python Command Terminal (MVP) — extended with extra safe commands + portable stat
+# Run with `python server.py`, or `uvicorn app:app --loop uvloop --http httptools`.
+import asyncio
+import bisect
 import shlex
-import subprocess
 import os
 import shutil
+import stat
 import time
+import fnmatch
+import functools
+import getpass
+import glob
 import hashlib
+import itertools
+import json
+import mimetypes
+import mmap
+import platform
 import re
+import secrets
+import threading
+from datetime import datetime
 from pathlib import Path
 from typing import Dict, Optional
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from threading import Lock
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # optional psutil import — fallback if not available
 try:
@@ -23,7 +40,50 @@ except Exception:
     psutil = None
     _HAS_PSUTIL = False
 
-app = FastAPI(title="Safe Python Command Terminal (MVP)")
+# fcntl is POSIX-only; used for reflink copies on Linux
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# optional hyperscan import — SIMD literal scanning for grep, falls back to re
+try:
+    import hyperscan
+    _HAS_HYPERSCAN = True
+except Exception:
+    hyperscan = None
+    _HAS_HYPERSCAN = False
+
+# optional orjson import — faster JSON encode/decode, falls back to stdlib json
+try:
+    import orjson
+    _HAS_ORJSON = True
+except Exception:
+    orjson = None
+    _HAS_ORJSON = False
+
+
+def _dumps(content) -> bytes:
+    if _HAS_ORJSON:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(data: bytes):
+    if _HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed (same output shape as stdlib)."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return _dumps(content)
+
+
+app = FastAPI(title="Safe Python Command Terminal (MVP)", default_response_class=ORJSONResponse)
 
 # Allow CORS for demo (change allow_origins in production)
 app.add_middleware(
@@ -34,215 +94,462 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Command output is plain text inside JSON and compresses well; tiny replies are sent as-is.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Serve static files from /static so API routes remain reachable.
 # Move your JS/CSS/images into a "static/" folder in project root if you use this.
-app.mount("/static", StaticFiles(directory="static"), name="static")
+STATIC_DIR = Path.cwd() / "static"
+STATIC_CACHE_MAX = 1024 * 1024  # files up to this size are kept in memory
+_STATIC_CACHE: Dict[str, tuple] = {}  # url path -> (bytes, etag, media type)
+_static_files = StaticFiles(directory="static")
+
+
+@app.on_event("startup")
+def _load_static_cache():
+    """Read small static assets once so requests for them skip stat/open/read entirely."""
+    _STATIC_CACHE.clear()
+    for root, _dirs, files in os.walk(STATIC_DIR):
+        for f in files:
+            fp = Path(root) / f
+            try:
+                if fp.stat().st_size > STATIC_CACHE_MAX:
+                    continue
+                data = fp.read_bytes()
+            except Exception:
+                continue
+            key = fp.relative_to(STATIC_DIR).as_posix()
+            media_type = mimetypes.guess_type(f)[0] or "application/octet-stream"
+            _STATIC_CACHE[key] = (data, '"' + hashlib.sha1(data).hexdigest() + '"', media_type)
+
+
+# Registered before the mount so it is matched first; the mount stays for url_for("static").
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def static_cached(path: str, request: Request):
+    entry = _STATIC_CACHE.get(path)
+    if entry is None:
+        # large or newly added files: fall back to the regular StaticFiles handling
+        return await _static_files.get_response(path, request.scope)
+    data, etag, media_type = entry
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
+app.mount("/static", _static_files, name="static")
 
 # Limit operations to a sandbox directory inside project
 ROOT = Path.cwd() / "sandbox"
 ROOT.mkdir(exist_ok=True)
 
-# Current working directory (starts at ROOT). Protected by lock for thread-safety.
-CURRENT_DIR = ROOT.resolve()
-_dir_lock = Lock()
+# Resolved once: safe_path compares against these on every command.
+_ROOT_RESOLVED = ROOT.resolve()
+_ROOT_DIR = str(_ROOT_RESOLVED)
+_ROOT_STR = _ROOT_DIR + os.sep  # trailing separator so "sandbox-evil" is not treated as inside
+TRASH_DIR = _ROOT_RESOLVED / ".trash"
 
-# Process tracking for kill support
-PROCESS_LOCK = Lock()
-CURRENT_PROCESS = None  # will hold subprocess.Popen while a command is running
+
+class SessionState:
+    """
+    Per-browser terminal state: working directory (starts at ROOT) and the process currently
+    running for this session, so concurrent users neither share a cwd nor kill each other's commands.
+    """
+    __slots__ = ("cwd", "current_proc", "lock")
+
+    def __init__(self):
+        self.cwd = _ROOT_RESOLVED
+        self.current_proc = None  # asyncio.subprocess.Process while a command is running
+        self.lock = asyncio.Lock()  # guards current_proc between a command and /api/kill
+
+
+SESSION_COOKIE = "sid"
+MAX_SESSIONS = 1000  # least recently used sessions are dropped beyond this
+SESSIONS: "OrderedDict[str, SessionState]" = OrderedDict()
+# sessions whose cookie has not come back yet; kept apart so one-shot clients (scripts, probes)
+# only ever push each other out, never the established sessions in SESSIONS
+MAX_NEW_SESSIONS = 1000
+NEW_SESSIONS: "OrderedDict[str, SessionState]" = OrderedDict()
+
+
+@app.middleware("http")
+async def _session_middleware(request: Request, call_next):
+    """Attach the caller's SessionState (or None) to request.state; cookie for sessions made by _session_for."""
+    sid = request.cookies.get(SESSION_COOKIE)
+    session = None
+    if sid:
+        session = SESSIONS.get(sid)
+        if session is not None:
+            SESSIONS.move_to_end(sid)
+        else:
+            # first return visit: promote the session into the main LRU
+            session = NEW_SESSIONS.pop(sid, None)
+            if session is not None:
+                SESSIONS[sid] = session
+                while len(SESSIONS) > MAX_SESSIONS:
+                    SESSIONS.popitem(last=False)
+    request.state.session = session
+    request.state.new_sid = None
+    response = await call_next(request)
+    if request.state.new_sid:
+        response.set_cookie(SESSION_COOKIE, request.state.new_sid, httponly=True, samesite="lax")
+    return response
+
+
+def _session_for(request: Request) -> SessionState:
+    """The caller's session, created on first use by a handler that needs one (cookie set by the middleware)."""
+    session = request.state.session
+    if session is None:
+        sid = secrets.token_urlsafe(16)
+        session = SessionState()
+        NEW_SESSIONS[sid] = session
+        while len(NEW_SESSIONS) > MAX_NEW_SESSIONS:
+            NEW_SESSIONS.popitem(last=False)
+        request.state.session = session
+        request.state.new_sid = sid
+    return session
 
 # Whitelist (extended)
-WHITELIST = {
+WHITELIST = frozenset({
     "ls", "dir", "pwd", "cat", "type", "read", "echo", "mkdir", "rmdir", "touch", "stat",
     "whoami", "uname", "df", "du", "ps", "stats", "help",
     "cd", "write", "append", "rm", "mv", "cp", "restore", "empty-trash",
     "head", "tail", "grep", "find", "tree", "wc", "md5", "sha256"
-}
+})
+
+# WHITELIST never changes at runtime, so the help text and /api/whitelist body are built once
+_HELP_STR = "Allowed commands: " + ", ".join(sorted(WHITELIST))
+_WL_JSON = _dumps({"allowed": sorted(WHITELIST)})
 
 MAX_OUTPUT_CHARS = 20000
+CAPTURE_BYTES = MAX_OUTPUT_CHARS * 4  # utf-8 needs at most 4 bytes per char
+PIPE_CHUNK = 16384
 TIMEOUT = 7  # seconds
+KILL_GRACE = 0.2  # seconds /api/kill waits after SIGTERM before sending SIGKILL
 
 
-def safe_path(path_str: str, base_dir: Optional[Path] = None) -> Path:
+@functools.lru_cache(maxsize=1024)
+def _fast_safe_path(path_str: str, base_str: str) -> str:
     """
-    Resolve a user-supplied path into the sandbox root. Prevent path traversal by mapping
-    absolute paths into the sandbox and ensuring the result starts with ROOT.
+    String-only core of safe_path built on os.path (no Path objects). Results only depend on the
+    arguments (and on-disk symlinks, which sandbox commands cannot create), so they are memoized.
     """
-    base = (base_dir or CURRENT_DIR).resolve()
-    p = Path(path_str)
-    if p.is_absolute():
+    if os.path.isabs(path_str):
         # Map absolute into sandbox root to avoid escapes
-        try:
-            candidate = (ROOT / p.relative_to(p.anchor)).resolve()
-        except Exception:
-            candidate = (ROOT / p.name).resolve()
+        rest = os.path.splitdrive(path_str)[1].lstrip("\\/")
+        candidate = os.path.join(_ROOT_DIR, rest)
     else:
-        candidate = (base / p).resolve()
+        candidate = os.path.join(base_str, path_str)
+    # realpath (not just normpath) so a symlink inside the sandbox cannot point outside it
+    candidate = os.path.realpath(candidate)
+    if candidate == _ROOT_DIR or candidate.startswith(_ROOT_STR):
+        return candidate
+    name = os.path.basename(os.path.normpath(path_str))
+    if name in ("", ".", ".."):
+        return _ROOT_DIR
+    candidate = os.path.realpath(os.path.join(_ROOT_DIR, name))
+    if candidate == _ROOT_DIR or candidate.startswith(_ROOT_STR):
+        return candidate
+    return _ROOT_DIR
+
+
+def safe_path(path_str: str, base_dir: Optional[Path] = None) -> Path:
+    """
+    Resolve a user-supplied path into the sandbox root. Prevent path traversal by mapping
+    absolute paths into the sandbox and ensuring the result stays under ROOT.
+    Callers that only need a string should use _fast_safe_path directly.
+    """
+    base = base_dir or _ROOT_RESOLVED
+    return Path(_fast_safe_path(path_str, str(base)))
+
+
+STATS_INTERVAL = 2.0  # seconds between background stats samples
+_STATS_CACHE = {"t": 0.0, "v": None}
+
+# seed psutil's cpu_percent counters once so later interval=None calls return real deltas
+if _HAS_PSUTIL:
     try:
-        if not str(candidate).startswith(str(ROOT.resolve())):
-            candidate = (ROOT / Path(path_str).name).resolve()
+        psutil.cpu_percent(interval=None)
+        for _p in psutil.process_iter():
+            try:
+                _p.cpu_percent(None)
+            except Exception:
+                pass
     except Exception:
-        candidate = (ROOT / Path(path_str).name).resolve()
-    return candidate
+        pass
+
+
+def _cached_stats() -> Optional[str]:
+    """Return the last sampled snapshot, or None if there is none recent enough to serve."""
+    if _STATS_CACHE["v"] is not None and time.monotonic() - _STATS_CACHE["t"] < 2 * STATS_INTERVAL:
+        return _STATS_CACHE["v"]
+    return None
 
 
 def get_system_stats() -> str:
     """
     Return a friendly CPU / memory summary and a small list of top CPU-consuming processes.
-    Uses a short two-sample approach to get reliable per-process cpu_percent values.
+    Serves the background sampler's snapshot when it is fresh and samples directly otherwise.
     """
+    cached = _cached_stats()
+    return cached if cached is not None else _sample_stats()
+
+
+def _sample_stats() -> str:
+    """
+    Take one stats sample and store it in _STATS_CACHE.
+    CPU counters are seeded at import, so each call reads the delta since the previous call
+    without sleeping.
+    """
+    now = time.monotonic()
     try:
         if _HAS_PSUTIL:
-            cpu_total = psutil.cpu_percent(interval=0.25)
+            cpu_total = psutil.cpu_percent(interval=None)
             mem = psutil.virtual_memory()
 
-            # collect process objects snapshot
-            procs = []
-            for p in psutil.process_iter(['pid', 'name']):
-                procs.append(p)
-
-            # initialize cpu_percent measurement for each process (first call seeds internal counters)
-            for p in procs:
-                try:
-                    p.cpu_percent(None)
-                except Exception:
-                    # ignore processes we can't query
-                    pass
-
-            # short sleep to allow cpu_percent to be measured over an interval
-            time.sleep(0.12)
-
-            # now read cpu_percent and memory_percent
-            procs_info = []
-            for p in procs:
+            # process_iter reuses cached Process objects, so cpu_percent is measured since the last call.
+            # Values go into parallel lists of primitives; only the top rows are formatted.
+            pids, names, cpus, mems = [], [], [], []
+            for p in psutil.process_iter():
                 try:
-                    info = p.as_dict(attrs=['pid', 'name'], ad_value="")
-                    cpu_p = p.cpu_percent(None) or 0.0
-                    mem_p = p.memory_percent() or 0.0
-                    # normalize long names
-                    name = (info.get('name') or "")[:20]
-                    procs_info.append({"pid": info.get('pid'), "name": name, "cpu": float(cpu_p), "mem": float(mem_p)})
+                    # oneshot() collapses the per-process /proc reads into a single pass
+                    with p.oneshot():
+                        name = p.name()[:20]
+                        cpu_p = p.cpu_percent(None) or 0.0
+                        mem_p = p.memory_percent() or 0.0
                 except Exception:
-                    # best-effort: skip processes we cannot inspect
+                    # best-effort: skip processes we cannot inspect (gone, access denied)
                     continue
+                pids.append(p.pid)
+                names.append(name)
+                cpus.append(cpu_p)
+                mems.append(mem_p)
 
             # sort by cpu desc and take top N
-            procs_sorted = sorted(procs_info, key=lambda x: x.get('cpu', 0.0), reverse=True)[:6]
+            order = sorted(range(len(pids)), key=cpus.__getitem__, reverse=True)[:6]
 
-            top_procs_lines = []
-            for pi in procs_sorted:
-                pid = pi.get('pid', 0)
-                name = (pi.get('name') or "")[:20]
-                cpu_p = pi.get('cpu', 0.0)
-                mem_p = pi.get('mem', 0.0)
-                top_procs_lines.append(f"{pid:6} {name:20} cpu={cpu_p:5.1f}% mem={mem_p:5.1f}%")
+            top_procs_lines = [
+                f"{pids[i]:6} {names[i]:20} cpu={cpus[i]:5.1f}% mem={mems[i]:5.1f}%"
+                for i in order
+            ]
 
             procs_text = "\n".join(top_procs_lines) if top_procs_lines else "No process info available (permission)."
 
-            return f"CPU: {cpu_total:.1f}%\nMemory: {mem.percent:.1f}% ({int(mem.used/1024**2)}MB used of {int(mem.total/1024**2)}MB)\n\nTop processes:\n{procs_text}"
+            text = f"CPU: {cpu_total:.1f}%\nMemory: {mem.percent:.1f}% ({int(mem.used/1024**2)}MB used of {int(mem.total/1024**2)}MB)\n\nTop processes:\n{procs_text}"
+            _STATS_CACHE["t"] = now
+            _STATS_CACHE["v"] = text
+            return text
         else:
-            import platform
             return f"psutil not available — fallback info: {platform.system()} {platform.release()}"
     except Exception:
         # fallback minimal info if psutil can't be used
-        import platform
         try:
             return f"psutil error — fallback info: {platform.system()} {platform.release()}"
         except Exception:
             return "psutil not available and fallback failed."
 
 
-def windows_translate(parts: list) -> list:
+async def _stats_refresher():
+    # keeps _STATS_CACHE warm so ps/stats never pay for a process scan on the request path
+    while True:
+        try:
+            await asyncio.to_thread(_sample_stats)
+        except Exception:
+            pass
+        await asyncio.sleep(STATS_INTERVAL)
+
+
+@app.on_event("startup")
+async def _start_stats_refresher():
+    if _HAS_PSUTIL:
+        app.state.stats_task = asyncio.create_task(_stats_refresher())
+
+
+@app.on_event("shutdown")
+async def _stop_stats_refresher():
+    task = getattr(app.state, "stats_task", None)
+    if task is not None:
+        task.cancel()
+        app.state.stats_task = None
+
+
+_IS_WINDOWS = os.name == "nt"
+
+# PowerShell argv prefixes for commands that translate 1:1 (args are appended as-is)
+_PS = ("powershell", "-NoProfile", "-Command")
+_WIN_TEMPLATES = {
+    "ls": _PS + ("Get-ChildItem", "-Force", "-Name"),
+    "dir": _PS + ("Get-ChildItem", "-Force", "-Name"),
+    "cat": _PS + ("Get-Content", "-Raw"),
+    "type": _PS + ("Get-Content", "-Raw"),
+    "read": _PS + ("Get-Content", "-Raw"),
+}
+# per-argument PowerShell statements, joined with " ; "
+_WIN_SCRIPTS = {
+    "mkdir": "New-Item -ItemType Directory -Force -Path '{}'",
+    "rmdir": "Remove-Item -Recurse -Force '{}'",
+}
+_WIN_MISSING_ARG = {
+    "cat": "'Error: missing filename'",
+    "type": "'Error: missing filename'",
+    "read": "'Error: missing filename'",
+    "mkdir": "'Error: missing directory name'",
+    "rmdir": "'Error: missing directory name'",
+}
+
+
+def windows_translate(parts: list, cwd: Path = _ROOT_RESOLVED) -> list:
     """
     Translate simple commands into PowerShell invocations when running on Windows.
     This ensures cross-platform behaviour for ls/cat/pwd/etc.
     """
     base = parts[0].lower()
-    args = parts[1:]
-    def sp(p): return str(p)
-    if base in ("ls", "dir"):
-        ps = ["powershell", "-NoProfile", "-Command", "Get-ChildItem", "-Force", "-Name"]
-        if args:
-            ps.append("--%"); ps += [sp(a) for a in args]
-        return ps
-    if base in ("cat", "type", "read"):
-        if not args:
-            return ["powershell", "-NoProfile", "-Command", "Write-Output", "'Error: missing filename'"]
-        files = [sp(a) for a in args]
-        return ["powershell", "-NoProfile", "-Command", "Get-Content", "-Raw"] + files
-    if base == "mkdir":
-        if not args:
-            return ["powershell", "-NoProfile", "-Command", "Write-Output", "'Error: missing directory name'"]
-        cmd = " ; ".join([f"New-Item -ItemType Directory -Force -Path '{sp(a)}'" for a in args])
-        return ["powershell", "-NoProfile", "-Command", cmd]
-    if base == "rmdir":
-        if not args:
-            return ["powershell", "-NoProfile", "-Command", "Write-Output", "'Error: missing directory name'"]
-        cmd = " ; ".join([f"Remove-Item -Recurse -Force '{sp(a)}'" for a in args])
-        return ["powershell", "-NoProfile", "-Command", cmd]
+    args = [str(a) for a in parts[1:]]
+    if not args and base in _WIN_MISSING_ARG:
+        return [*_PS, "Write-Output", _WIN_MISSING_ARG[base]]
+    tmpl = _WIN_TEMPLATES.get(base)
+    if tmpl is not None:
+        if base in ("ls", "dir") and args:
+            return [*tmpl, "--%", *args]
+        return [*tmpl, *args]
+    script = _WIN_SCRIPTS.get(base)
+    if script is not None:
+        return [*_PS, " ; ".join(script.format(a) for a in args)]
     if base == "echo":
-        text = " ".join(args) if args else ""
-        return ["powershell", "-NoProfile", "-Command", "Write-Output", text]
+        return [*_PS, "Write-Output", " ".join(args)]
     if base == "pwd":
-        return ["powershell", "-NoProfile", "-Command", "Write-Output", str(CURRENT_DIR)]
-    fallback = [parts[0]] + [sp(a) for a in args]
-    return fallback
+        return [*_PS, "Write-Output", str(cwd)]
+    return [parts[0], *args]
+
+
+def _posix_argv(parts: list, cwd: Path) -> list:
+    return parts
+
+
+# chosen once: the platform never changes while the server runs
+_translate = windows_translate if _IS_WINDOWS else _posix_argv
+
+
+# last suffix handed out per (directory, name, infix), so a name that keeps colliding
+# (log.txt deleted over and over) is not re-probed from _1 every time
+_COLLISION_SEQ: Dict[tuple, int] = {}
+COLLISION_SEQ_MAX = 4096
+# held from picking a free name until the move lands on it: rm/restore run on the I/O pool,
+# and two threads choosing the same name would have the second move replace the first file
+_TRASH_LOCK = threading.Lock()
+
+
+def _unique_dest(directory: Path, name: str, infix: str) -> Path:
+    """directory/name if free, else the first free directory/<stem><infix><n><suffix>."""
+    dest = directory / name
+    if not dest.exists():
+        return dest
+    key = (str(directory), name, infix)
+    i = _COLLISION_SEQ.get(key, 0) + 1
+    stem, suf = dest.stem, dest.suffix
+    while True:
+        dest = directory / f"{stem}{infix}{i}{suf}"
+        if not dest.exists():
+            break
+        i += 1
+    if len(_COLLISION_SEQ) >= COLLISION_SEQ_MAX:
+        _COLLISION_SEQ.clear()
+    _COLLISION_SEQ[key] = i
+    return dest
 
 
 def _move_to_trash(target: Path) -> str:
-    trash = ROOT / ".trash"
+    trash = TRASH_DIR
     trash.mkdir(exist_ok=True)
-    name = target.name
-    dest = trash / name
-    if dest.exists():
-        base = dest.stem; suf = dest.suffix; i = 1
-        while True:
-            newname = f"{base}_{i}{suf}"
-            dest = trash / newname
-            if not dest.exists():
-                break
-            i += 1
-    try:
-        # use replace to move atomically when possible
-        target.replace(dest)
-        return f"Moved to trash: {target.name} -> {dest.name}"
-    except Exception:
-        # fallback to shutil.move
+    with _TRASH_LOCK:
+        dest = _unique_dest(trash, target.name, "_")
         try:
-            shutil.move(str(target), str(dest))
+            # use replace to move atomically when possible
+            target.replace(dest)
             return f"Moved to trash: {target.name} -> {dest.name}"
-        except Exception as e:
-            return f"{target.name}: move to trash failed: {e}"
+        except Exception:
+            # fallback to shutil.move
+            try:
+                shutil.move(str(target), str(dest), copy_function=_copy_file_fast)
+                return f"Moved to trash: {target.name} -> {dest.name}"
+            except Exception as e:
+                return f"{target.name}: move to trash failed: {e}"
+
 
+def _cap(text: str, tag: str) -> str:
+    """text, or its first MAX_OUTPUT_CHARS characters followed by tag on its own line."""
+    return text if len(text) <= MAX_OUTPUT_CHARS else f"{text[:MAX_OUTPUT_CHARS]}\n{tag}"
 
-def _spawn_and_wait(args, cwd: Path) -> Dict:
+
+def _decode_capped(buf, tag: str) -> str:
+    # decoding through a memoryview slice avoids copying the capture buffer first
+    return _cap(str(memoryview(buf)[:CAPTURE_BYTES], "utf8", "replace"), tag)
+
+
+async def _spawn_and_wait(args, session: SessionState) -> Dict:
     """
-    Spawn a subprocess and wait for completion with a timeout.
-    Keeps track of CURRENT_PROCESS so /api/kill can terminate it.
+    Spawn a subprocess and wait for completion with a timeout without blocking the event loop.
+    Output is read incrementally into bounded buffers; a child that exceeds CAPTURE_BYTES is
+    killed instead of being buffered in full. Runs in session.cwd and keeps track of
+    session.current_proc so /api/kill can terminate it. Always returns ok/stdout/stderr/rc.
     """
-    global CURRENT_PROCESS
     proc = None
+    out_buf, err_buf = bytearray(), bytearray()
+    capped = False
+
+    async def _pump(stream, buf: bytearray):
+        nonlocal capped
+        while len(buf) < CAPTURE_BYTES:
+            chunk = await stream.read(PIPE_CHUNK)
+            if not chunk:
+                return
+            buf += chunk
+        # output cap reached: stop the child, then drop whatever is left in the pipe until EOF
+        capped = True
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        while await stream.read(PIPE_CHUNK):
+            pass
+
+    async def _collect():
+        await asyncio.gather(_pump(proc.stdout, out_buf), _pump(proc.stderr, err_buf))
+        return await proc.wait()
+
     try:
-        with PROCESS_LOCK:
-            proc = subprocess.Popen(args, cwd=str(cwd), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            CURRENT_PROCESS = proc
+        async with session.lock:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *args, cwd=str(session.cwd), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                )
+            except OSError as e:
+                # same result shape as a finished command (127 = not found, like a shell)
+                rc = 127 if isinstance(e, FileNotFoundError) else 126
+                return {"ok": False, "stdout": "", "stderr": f"{args[0]}: {e.strerror}", "rc": rc}
+            session.current_proc = proc
         try:
-            out, err = proc.communicate(timeout=TIMEOUT)
-            rc = proc.returncode
-        except subprocess.TimeoutExpired:
-            with PROCESS_LOCK:
+            rc = await asyncio.wait_for(_collect(), timeout=TIMEOUT)
+        except asyncio.TimeoutError:
+            async with session.lock:
                 try:
                     proc.kill()
                 except Exception:
                     pass
             try:
-                out, err = proc.communicate(timeout=2)
+                await asyncio.wait_for(_collect(), timeout=2)
             except Exception:
-                out, err = "", "Process killed due to timeout."
+                err_buf += b"Process killed due to timeout."
             rc = -1
-        return {"ok": rc == 0, "stdout": (out or ""), "stderr": (err or ""), "rc": rc}
+        return {
+            "ok": rc == 0 or (capped and rc != -1),
+            "stdout": _decode_capped(out_buf, "[truncated output]"),
+            "stderr": _decode_capped(err_buf, "[truncated stderr]"),
+            "rc": rc,
+        }
     finally:
-        with PROCESS_LOCK:
-            CURRENT_PROCESS = None
+        async with session.lock:
+            session.current_proc = None
 
 
 def _safe_mv(src: Path, dest: Path) -> str:
@@ -254,12 +561,52 @@ def _safe_mv(src: Path, dest: Path) -> str:
             final = dest / src.name
         else:
             final = dest
-        shutil.move(str(src), str(final))
+        shutil.move(str(src), str(final), copy_function=_copy_file_fast)
         return f"Moved: {src.name} -> {final}"
     except Exception as e:
         return f"Move failed: {e}"
 
 
+COPY_CHUNK = 1 << 30  # bytes per copy_file_range call
+FICLONE = 0x40049409  # linux/fs.h: share the source's extents with the destination (reflink)
+_CAN_REFLINK = fcntl is not None and platform.system() == "Linux"
+
+
+def _reflink(fsrc_fd: int, fdst_fd: int) -> bool:
+    if not _CAN_REFLINK:
+        return False
+    try:
+        fcntl.ioctl(fdst_fd, FICLONE, fsrc_fd)
+        return True
+    except OSError:
+        # not a CoW filesystem, or src/dst on different filesystems
+        return False
+
+
+def _copy_file_fast(src, dst):
+    """
+    shutil.copy2 equivalent that avoids moving data through userspace: a FICLONE reflink on
+    CoW filesystems (Btrfs/XFS), then os.copy_file_range, then copy2 when neither is supported.
+    Takes str or Path so it can be used as copytree/move's copy_function.
+    """
+    # checked before dst is opened for writing, which would truncate src when they are one file
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                if not _reflink(fsrc.fileno(), fdst.fileno()):
+                    while os.copy_file_range(fsrc.fileno(), fdst.fileno(), COPY_CHUNK):
+                        pass
+            shutil.copystat(str(src), str(dst))
+            return dst
+        except OSError:
+            # EXDEV / ENOSYS / EINVAL etc.: copy2 rewrites the destination from scratch
+            pass
+    shutil.copy2(str(src), str(dst))
+    return dst
+
+
 def _safe_cp(src: Path, dest: Path, recursive: bool = False) -> str:
     try:
         if src.is_dir():
@@ -272,43 +619,45 @@ def _safe_cp(src: Path, dest: Path, recursive: bool = False) -> str:
                 final = dest
             if final.exists():
                 return f"Destination already exists: {final}"
-            shutil.copytree(str(src), str(final))
+            shutil.copytree(str(src), str(final), copy_function=_copy_file_fast)
             return f"Directory copied: {src.name} -> {final}"
         else:
             dest_parent = dest if dest.is_dir() else dest.parent
             dest_parent.mkdir(parents=True, exist_ok=True)
             final = dest if not dest.is_dir() and dest.suffix else (dest_parent / src.name if dest.is_dir() else dest)
-            shutil.copy2(str(src), str(final))
+            _copy_file_fast(src, final)
             return f"Copied: {src.name} -> {final}"
     except Exception as e:
         return f"Copy failed: {e}"
 
 
 def _restore_from_trash(name: str, target_dir: Path) -> str:
-    trash = ROOT / ".trash"
+    trash = TRASH_DIR
     src = trash / name
     if not src.exists():
         return f"{name}: not found in trash"
     # choose destination name and avoid collision
-    dest = target_dir / name
-    if dest.exists():
-        base = dest.stem; suf = dest.suffix; i = 1
-        while True:
-            candidate = target_dir / f"{base}_restored_{i}{suf}"
-            if not candidate.exists():
-                dest = candidate
-                break
-            i += 1
-    try:
-        shutil.move(str(src), str(dest))
-        return f"Restored: {name} -> {dest.name}"
-    except Exception as e:
-        return f"Restore failed: {e}"
+    with _TRASH_LOCK:
+        dest = _unique_dest(target_dir, name, "_restored_")
+        try:
+            shutil.move(str(src), str(dest), copy_function=_copy_file_fast)
+            return f"Restored: {name} -> {dest.name}"
+        except Exception as e:
+            return f"Restore failed: {e}"
 
 
 # --- Extra helpers for new commands ---
 def _read_file_lines(path: Path, max_lines: Optional[int] = None):
     try:
+        if max_lines is not None and max_lines >= 0:
+            # stop reading once we have enough lines instead of loading the whole file
+            lines = []
+            with path.open("r", encoding="utf8", errors="replace") as fh:
+                for ln in fh:
+                    if len(lines) >= max_lines:
+                        break
+                    lines.extend(ln.splitlines())
+            return lines[:max_lines]
         text = path.read_text(encoding="utf8", errors="replace")
         lines = text.splitlines()
         if max_lines is not None:
@@ -318,43 +667,189 @@ def _read_file_lines(path: Path, max_lines: Optional[int] = None):
         raise
 
 
+TAIL_BLOCK = 8192  # bytes read per step when scanning backwards from the end of a file
+
+
 def _tail_file_lines(path: Path, n: int = 10):
     try:
-        text = path.read_text(encoding="utf8", errors="replace")
-        lines = text.splitlines()
-        return lines[-n:]
+        if n <= 0:
+            text = path.read_text(encoding="utf8", errors="replace")
+            return text.splitlines()[-n:]
+        # read fixed-size blocks backwards until more than n newlines are buffered
+        with path.open("rb") as fh:
+            fh.seek(0, os.SEEK_END)
+            pos = fh.tell()
+            blocks = []
+            count = 0
+            while pos > 0 and count <= n:
+                step = min(TAIL_BLOCK, pos)
+                pos -= step
+                fh.seek(pos)
+                buf = fh.read(step)
+                blocks.append(buf)
+                count += buf.count(b"\n")
+        text = b"".join(reversed(blocks)).decode("utf8", errors="replace")
+        # match read_text()'s universal newline handling before splitting
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text.splitlines()[-n:]
     except Exception as e:
         raise
 
 
-def _grep_in_file(path: Path, pattern: str, ignore_case: bool = False, use_regex: bool = False):
+# \A/\Z and lookarounds see neighbouring lines when the pattern runs over the whole buffer
+_GREP_LINE_CONTEXT = re.compile(r"\\[AZ]|\(\?<?[=!]")
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_grep(pattern: str, ignore_case: bool, use_regex: bool):
+    """Compiled grep pattern, memoized so repeated greps reuse the same automaton."""
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    if use_regex:
+        try:
+            return re.compile(pattern, flags)
+        except re.error:
+            # fall back to substring if regex bad
+            pass
+    return re.compile(re.escape(pattern), flags)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_hs(pattern: str, ignore_case: bool):
+    """Hyperscan block-mode database for an ASCII literal, memoized like _compile_grep."""
+    expr = "".join(c if c.isalnum() else "\\x%02x" % ord(c) for c in pattern)
+    db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+    db.compile(expressions=[expr.encode("ascii")], flags=[hyperscan.HS_FLAG_CASELESS if ignore_case else 0])
+    return db
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_grep_bytes(pattern: str, ignore_case: bool):
+    """Bytes regex for an ASCII literal; re's bytes IGNORECASE is ASCII-only, like Hyperscan's."""
+    return re.compile(re.escape(pattern.encode("ascii")), re.IGNORECASE if ignore_case else 0)
+
+
+def _is_ascii_literal(pattern: str, use_regex: bool) -> bool:
+    # only plain ASCII literals: there bytes matching (and ASCII-only caseless) agrees with re on text
+    if not pattern or not pattern.isascii() or "\n" in pattern or "\r" in pattern:
+        return False
+    return not use_regex or re.escape(pattern) == pattern
+
+
+GREP_HS_MAX_HITS = 4096  # beyond this many hits a file is scanned with the bytes regex instead
+
+
+def _grep_in_file_bytes(path: Path, pattern: str, ignore_case: bool):
+    """
+    _grep_in_file for ASCII literals without decoding the file: the pattern is found in the raw
+    bytes (Hyperscan when installed, else a bytes regex) and only matching lines are decoded.
+    Returns None when the file needs newline translation or Unicode case folding.
+    """
+    data = path.read_bytes()
+    if b"\r" in data:
+        # text mode turns \r and \r\n into \n; let the re path handle those files
+        return None
+    if ignore_case and not data.isascii():
+        # re's Unicode case folding also matches a few non-ASCII letters (e.g. KELVIN SIGN for k)
+        return None
+    ends = []
+    if _HAS_HYPERSCAN:
+        def on_match(_id, _frm, to, _flags, _ctx):
+            ends.append(to)
+            # returning True halts the scan: on dense files the per-hit callback costs more than re
+            return len(ends) >= GREP_HS_MAX_HITS
+        try:
+            _compile_hs(pattern, ignore_case).scan(data, match_event_handler=on_match)
+        except hyperscan.ScanTerminated:
+            # raised when on_match halts the scan; the bytes regex below takes over
+            pass
+        if not ends:
+            return []
+    if ends and len(ends) < GREP_HS_MAX_HITS:
+        plen = len(pattern)
+
+        def next_hit(pos):
+            i = bisect.bisect_left(ends, pos + plen)
+            return ends[i] - plen if i < len(ends) else -1
+    else:
+        rx = _compile_grep_bytes(pattern, ignore_case)
+
+        def next_hit(pos):
+            m = rx.search(data, pos)
+            return m.start() if m else -1
     out = []
-    flags = re.IGNORECASE if ignore_case else 0
+    n = len(data)
+    pos = 0
+    lineno = 1
+    counted = 0
+    while pos < n:
+        hit = next_hit(pos)
+        if hit < 0:
+            break
+        start = data.rfind(b"\n", 0, hit) + 1
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = n
+        lineno += data.count(b"\n", counted, start)
+        counted = start
+        out.append(f"{lineno}:{data[start:end].decode('utf8', errors='replace')}")
+        pos = end + 1
+    return out
+
+
+def _grep_in_file(path: Path, pattern: str, ignore_case: bool = False, use_regex: bool = False):
+    """
+    Return "lineno:line" entries for lines matching pattern. The pattern is compiled once and
+    run over the whole decoded file, so only lines containing a candidate match are touched;
+    each candidate is re-checked on its own, and patterns whose anchors or lookarounds would
+    see past the line (_GREP_LINE_CONTEXT) are searched line by line instead.
+    ASCII literals are matched on the raw bytes instead (see _grep_in_file_bytes).
+    """
+    if _is_ascii_literal(pattern, use_regex):
+        try:
+            out = _grep_in_file_bytes(path, pattern, ignore_case)
+            if out is not None:
+                return out
+        except OSError:
+            # unreadable here is unreadable on the text path too
+            return []
+    rx = _compile_grep(pattern, ignore_case, use_regex)
     try:
-        with path.open('r', encoding='utf8', errors='replace') as fh:
-            for i, ln in enumerate(fh, start=1):
-                hay = ln.rstrip("\n")
-                matched = False
-                if use_regex:
-                    try:
-                        if re.search(pattern, hay, flags):
-                            matched = True
-                    except re.error:
-                        # fall back to substring if regex bad
-                        if (pattern.lower() in hay.lower()) if ignore_case else (pattern in hay):
-                            matched = True
-                else:
-                    if ignore_case:
-                        if pattern.lower() in hay.lower():
-                            matched = True
-                    else:
-                        if pattern in hay:
-                            matched = True
-                if matched:
-                    out.append(f"{i}:{hay}")
-        return out
+        text = path.read_text(encoding='utf8', errors='replace')
     except Exception:
         return []
+    out = []
+    if use_regex and _GREP_LINE_CONTEXT.search(pattern):
+        lines = text.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        search = rx.search
+        return [f"{i}:{ln}" for i, ln in enumerate(lines, start=1) if search(ln)]
+    n = len(text)
+    pos = 0
+    lineno = 1
+    counted = 0
+    while pos < n:
+        m = rx.search(text, pos)
+        if m is None:
+            break
+        start = text.rfind("\n", 0, m.start()) + 1
+        if start >= n:
+            # empty match after the trailing newline is not a line of the file
+            break
+        end = text.find("\n", start)
+        if end == -1:
+            end = n
+        lineno += text.count("\n", counted, start)
+        counted = start
+        hay = text[start:end]
+        # the buffer-wide match only finds a candidate line; report it if the line matches on its own
+        if rx.search(hay) is not None:
+            out.append(f"{lineno}:{hay}")
+        pos = end + 1
+    return out
+
+
+HASH_MMAP_MAX = 128 << 20  # files up to this size are hashed from a single mapping
 
 
 def _compute_hash(path: Path, algo: str = "sha256"):
@@ -364,499 +859,865 @@ def _compute_hash(path: Path, algo: str = "sha256"):
         return None
     try:
         with path.open("rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                h.update(chunk)
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return h.hexdigest()
+            if size > HASH_MMAP_MAX and hasattr(hashlib, "file_digest"):
+                # Python 3.11+: C-level reader feeds large blocks straight into OpenSSL
+                return hashlib.file_digest(f, lambda: h).hexdigest()
+            # hand the whole mapped file to update() in one call (no read copies, GIL released)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                h.update(mm)
         return h.hexdigest()
     except Exception:
         return None
 
 
+TREE_MAX_LINES = 5000  # bound tree output (and work) on huge directory trees
+
+
 def _tree_listing(start: Path, max_depth: int = 3):
-    out = []
     start = start.resolve()
-    def _walk(p: Path, depth=0):
+    def _walk(p, depth=0):
         if depth > max_depth:
             return
         try:
-            for entry in sorted(p.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower())):
-                prefix = "  " * depth + ("└─ " if depth else "")
-                out.append(prefix + entry.name + ("/" if entry.is_dir() else ""))
-                if entry.is_dir():
-                    _walk(entry, depth + 1)
+            # DirEntry.is_dir() comes from readdir, so sorting costs no extra stat calls
+            with os.scandir(p) as it:
+                entries = sorted(it, key=lambda e: (not e.is_dir(follow_symlinks=False), e.name.lower()))
         except Exception:
-            out.append("  " * depth + "[permission denied or unreadable]")
-    _walk(start, 0)
+            yield "  " * depth + "[permission denied or unreadable]"
+            return
+        prefix = "  " * depth + ("└─ " if depth else "")
+        for entry in entries:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            yield prefix + entry.name + ("/" if is_dir else "")
+            if is_dir:
+                yield from _walk(entry.path, depth + 1)
+    out = list(itertools.islice(_walk(start, 0), TREE_MAX_LINES + 1))
+    if len(out) > TREE_MAX_LINES:
+        out[TREE_MAX_LINES:] = ["[truncated]"]
     return out
 
 
-def _wc_counts(path: Path):
+def _find_files(start: Path, maxdepth: int, name_pat: Optional[str] = None):
+    """
+    Files under start (in os.walk's top-down order) as paths relative to the sandbox root.
+    Walks with an explicit scandir stack so each entry's type comes from readdir and depth is
+    carried along instead of being recomputed. Symlinked directories are listed nowhere and
+    not descended into, as with os.walk. name_pat is a glob when it has wildcards, else a substring.
+    """
+    if name_pat and any(c in name_pat for c in "*?["):
+        match = functools.partial(fnmatch.fnmatchcase, pat=name_pat)
+    elif name_pat:
+        match = lambda name: name_pat in name
+    else:
+        match = None
+    out = []
+    stack = [(str(start), 0)]
+    while stack:
+        top, depth = stack.pop()
+        if depth > maxdepth:
+            continue
+        subdirs = []
+        try:
+            with os.scandir(top) as it:
+                for e in it:
+                    try:
+                        is_dir = e.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        if not e.is_symlink():
+                            subdirs.append(e.path)
+                    elif match is None or match(e.name):
+                        p = e.path
+                        out.append(p[len(_ROOT_STR):] if p.startswith(_ROOT_STR) else p)
+        except OSError:
+            # unreadable directory: skipped, as os.walk does
+            continue
+        # reversed so the first subdirectory is walked next
+        stack.extend((d, depth + 1) for d in reversed(subdirs))
+    return out
+
+
+# O_BINARY (Windows) keeps the CRT from translating newlines; _write_fd does it explicitly
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+
+
+def _write_fd(path: Path, content: str, flags: int):
+    """
+    Write content with a bare os.open/os.write. The parent directory is only created when the
+    open fails for lack of it, so the common case costs no mkdir/stat calls.
+    """
+    if os.linesep != "\n":
+        # same newline translation write_text()/open("a") did in text mode
+        content = content.replace("\n", os.linesep)
+    data = memoryview(content.encode("utf8"))
     try:
-        text = path.read_text(encoding="utf8", errors="replace")
-        lines = text.splitlines()
-        words = sum(len(l.split()) for l in lines)
-        chars = len(text)
-        return {"lines": len(lines), "words": words, "chars": chars}
+        fd = os.open(path, flags, 0o666)
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, flags, 0o666)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+
+def _write_file(path: Path, content: str):
+    _write_fd(path, content, _WRITE_FLAGS | os.O_TRUNC)
+
+
+def _append_file(path: Path, content: str):
+    _write_fd(path, content, _WRITE_FLAGS | os.O_APPEND)
+
+
+def _fmt_time(ts: float) -> str:
+    # same text as strftime("%Y-%m-%d %H:%M:%S") on local time, without parsing a format string
+    return datetime.fromtimestamp(ts).isoformat(" ", "seconds")
+
+
+def _stat_text(target: Path) -> Optional[str]:
+    """Format stat output from a single os.stat call; None if the path does not exist."""
+    try:
+        st = os.stat(target)
+    except FileNotFoundError:
+        return None
+    typ = "directory" if stat.S_ISDIR(st.st_mode) else "file"
+    return (
+        f"Path: {target}\n"
+        f"Type: {typ}\n"
+        f"Size: {st.st_size} bytes\n"
+        f"Permissions (octal): {oct(st.st_mode & 0o777)}\n"
+        f"Modified: {_fmt_time(st.st_mtime)}\n"
+        f"Accessed: {_fmt_time(st.st_atime)}\n"
+        f"Created: {_fmt_time(st.st_ctime)}"
+    )
+
+
+_WC_SPACE = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+# maps whitespace bytes to b"0" and everything else to b"1", so each word starts at a b"01"
+_WC_WORD_MARKS = bytes(0x30 if b in _WC_SPACE else 0x31 for b in range(256))
+
+
+_WC_ALL = ("lines", "words", "chars")
+
+
+def _wc_counts(path: Path, which=_WC_ALL):
+    """
+    Count lines, words and characters with bytes.count/translate/decode so the work stays in C
+    (no per-line lists). All three follow the raw bytes: only "\n" ends a line (plus an
+    unterminated last line), only ASCII whitespace separates words, and "\r\n" is two characters.
+    Only the counts named in `which` are computed, so wc -l is a single count() pass.
+    """
+    try:
+        data = path.read_bytes()
+        counts = {}
+        if "lines" in which:
+            counts["lines"] = data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
+        if "words" in which:
+            marks = data.translate(_WC_WORD_MARKS)
+            counts["words"] = marks.count(b"01") + (1 if marks.startswith(b"1") else 0)
+        if "chars" in which:
+            # decoded from the same bytes as the line count, without newline translation
+            counts["chars"] = len(data.decode("utf-8", "replace"))
+        return counts
     except Exception:
         return None
 
 
-# ---- Core command runner ----
-def run_whitelisted_command(cmd: str) -> Dict:
-    global CURRENT_DIR
+# ---- Blocking file I/O runs on a dedicated, long-lived pool ----
+FILE_IO_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+@app.on_event("startup")
+def _start_file_pool():
+    app.state.file_pool = ThreadPoolExecutor(max_workers=FILE_IO_WORKERS, thread_name_prefix="sandbox-io")
+
+
+@app.on_event("shutdown")
+def _stop_file_pool():
+    pool = getattr(app.state, "file_pool", None)
+    if pool is not None:
+        pool.shutdown(wait=False)
+        app.state.file_pool = None
+
+
+async def _run_io(fn, *args):
+    """
+    Run a blocking helper on the file I/O pool so slow disk work neither stalls the event loop
+    nor competes with Starlette for the default executor (used as fallback before startup).
+    """
+    pool = getattr(app.state, "file_pool", None)
+    return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+
+# ---- Command handlers (one per built-in command) ----
+async def _h_help(parts: list, session: SessionState) -> Dict:
+    return {"ok": True, "stdout": _HELP_STR}
+
+
+async def _h_stats(parts: list, session: SessionState) -> Dict:
+    cached = _cached_stats()
+    if cached is not None:
+        return {"ok": True, "stdout": cached}
     try:
-        parts = shlex.split(cmd, posix=not os.name == "nt")
-        if len(parts) == 0:
-            return {"ok": False, "stderr": "Empty command."}
-        base = parts[0].lower()
-        if base not in WHITELIST:
-            return {"ok": False, "stderr": f"Command '{base}' not allowed."}
+        s = await asyncio.to_thread(get_system_stats)
+        return {"ok": True, "stdout": s}
+    except Exception as e:
+        return {"ok": False, "stderr": f"Could not retrieve stats: {e}"}
 
-        # help
-        if base == "help":
-            return {"ok": True, "stdout": "Allowed commands: " + ", ".join(sorted(WHITELIST))}
 
-        # stats
-        if base in ("ps", "stats"):
-            try:
-                s = get_system_stats()
-                return {"ok": True, "stdout": s}
-            except Exception as e:
-                return {"ok": False, "stderr": f"Could not retrieve stats: {e}"}
-
-        # cd
-        if base == "cd":
-            target = parts[1] if len(parts) > 1 else "."
-            with _dir_lock:
-                newp = safe_path(target, base_dir=CURRENT_DIR)
-                if newp.exists() and newp.is_dir():
-                    CURRENT_DIR = newp
-                    return {"ok": True, "stdout": str(CURRENT_DIR)}
-                else:
-                    return {"ok": False, "stderr": f"Directory not found: {newp}"}
-
-        # pwd
-        if base == "pwd":
-            return {"ok": True, "stdout": str(CURRENT_DIR)}
-
-        # stat  (portable, uses Python Path.stat)
-        if base == "stat":
-            # usage: stat <filename>
-            if len(parts) < 2:
-                return {"ok": False, "stderr": "stat requires a filename: stat file.txt"}
-            target = safe_path(parts[1], base_dir=CURRENT_DIR)
-            if not target.exists():
-                return {"ok": False, "stderr": f"File not found: {parts[1]}"}
-            try:
-                st = target.stat()
-                is_dir = target.is_dir()
-                size = st.st_size
-                mtime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(st.st_mtime))
-                atime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(st.st_atime))
-                ctime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(st.st_ctime))
-                perms = oct(st.st_mode & 0o777)
-                typ = "directory" if is_dir else "file"
-                out = (
-                    f"Path: {target}\n"
-                    f"Type: {typ}\n"
-                    f"Size: {size} bytes\n"
-                    f"Permissions (octal): {perms}\n"
-                    f"Modified: {mtime}\n"
-                    f"Accessed: {atime}\n"
-                    f"Created: {ctime}"
-                )
-                return {"ok": True, "stdout": out}
-            except Exception as e:
-                return {"ok": False, "stderr": f"stat failed: {e}"}
-
-        # read (alias of cat)
-        if base == "read":
-            if len(parts) < 2:
-                return {"ok": False, "stderr": "read requires a filename"}
-            target = safe_path(parts[1], base_dir=CURRENT_DIR)
-            if not target.exists() or not target.is_file():
-                return {"ok": False, "stderr": f"File not found: {target.name}"}
-            try:
-                text = target.read_text(encoding="utf8")
-                return {"ok": True, "stdout": text}
-            except Exception as e:
-                return {"ok": False, "stderr": f"Could not read file: {e}"}
-
-        # write
-        if base == "write":
-            if len(parts) < 3:
-                return {"ok": False, "stderr": "write requires a filename and text: write filename Hello"}
-            fname = parts[1]; content = " ".join(parts[2:])
-            target = safe_path(fname, base_dir=CURRENT_DIR)
-            try:
-                target.parent.mkdir(parents=True, exist_ok=True)
-                target.write_text(content, encoding="utf8")
-                return {"ok": True, "stdout": f"Wrote {target.name}"}
-            except Exception as e:
-                return {"ok": False, "stderr": f"Write failed: {e}"}
-
-        # append
-        if base == "append":
-            if len(parts) < 3:
-                return {"ok": False, "stderr": "append requires a filename and text"}
-            fname = parts[1]; content = " ".join(parts[2:])
-            target = safe_path(fname, base_dir=CURRENT_DIR)
-            try:
-                target.parent.mkdir(parents=True, exist_ok=True)
-                with target.open("a", encoding="utf8") as f:
-                    f.write(content)
-                return {"ok": True, "stdout": f"Appended to {target.name}"}
-            except Exception as e:
-                return {"ok": False, "stderr": f"Append failed: {e}"}
-
-        # rm (safe move to trash or permanent)
-        if base == "rm":
-            recursive = False; permanent = False; confirm = False; targets = []
-            for tok in parts[1:]:
-                if tok in ("-r", "-R", "--recursive"): recursive = True
-                elif tok in ("--permanent", "--perma"): permanent = True
-                elif tok == "--yes-i-know": confirm = True
-                else: targets.append(tok)
-            if not targets:
-                return {"ok": False, "stderr": "rm requires at least one target filename or directory"}
-            out_lines = []
-            for t in targets:
-                tgt = safe_path(t, base_dir=CURRENT_DIR)
-                if not tgt.exists():
-                    out_lines.append(f"{t}: not found"); continue
-                if tgt.is_dir() and not recursive and not permanent:
-                    out_lines.append(f"{t}: is a directory (use -r or --permanent --yes-i-know)"); continue
-                if not permanent:
-                    try:
-                        msg = _move_to_trash(tgt)
-                        out_lines.append(msg)
-                    except Exception as e:
-                        out_lines.append(f"{t}: failed to move to trash: {e}")
-                else:
-                    if not confirm:
-                        return {"ok": False, "stderr": "Permanent delete requires --yes-i-know flag alongside --permanent"}
-                    try:
-                        if tgt.is_dir(): shutil.rmtree(tgt)
-                        else: tgt.unlink()
-                        out_lines.append(f"Deleted permanently: {t}")
-                    except Exception as e:
-                        out_lines.append(f"{t}: delete failed: {e}")
-            return {"ok": True, "stdout": "\n".join(out_lines)}
-
-        # mv
-        if base == "mv":
-            if len(parts) < 3:
-                return {"ok": False, "stderr": "mv requires source and destination: mv src dest"}
-            src = safe_path(parts[1], base_dir=CURRENT_DIR)
-            dest = safe_path(parts[2], base_dir=CURRENT_DIR)
-            if not src.exists():
-                return {"ok": False, "stderr": f"Source not found: {parts[1]}"}
-            msg = _safe_mv(src, dest)
-            return {"ok": True, "stdout": msg}
-
-        # cp (supports -r flag for directories)
-        if base == "cp":
-            recursive = False
-            args = parts[1:]
-            if '-r' in args:
-                recursive = True
-                args = [a for a in args if a != '-r']
-            if len(args) < 2:
-                return {"ok": False, "stderr": "cp requires source and destination (use -r for directories)"}
-            src = safe_path(args[0], base_dir=CURRENT_DIR)
-            dest = safe_path(args[1], base_dir=CURRENT_DIR)
-            if not src.exists():
-                return {"ok": False, "stderr": f"Source not found: {args[0]}"}
-            msg = _safe_cp(src, dest, recursive=recursive)
-            return {"ok": True, "stdout": msg}
-
-        # restore <name>
-        if base == "restore":
-            if len(parts) < 2:
-                return {"ok": False, "stderr": "restore requires a filename present in .trash/"}
-            name = parts[1]
-            msg = _restore_from_trash(name, CURRENT_DIR)
-            return {"ok": True, "stdout": msg}
-
-        # empty-trash --yes-i-know
-        if base == "empty-trash":
-            if len(parts) < 2 or parts[1] != "--yes-i-know":
-                return {"ok": False, "stderr": "empty-trash is destructive. To confirm run: empty-trash --yes-i-know"}
-            trash = ROOT / ".trash"
-            if not trash.exists():
-                return {"ok": True, "stdout": "Trash is already empty"}
-            try:
-                for item in trash.iterdir():
-                    if item.is_dir():
-                        shutil.rmtree(item, ignore_errors=True)
-                    else:
-                        try: item.unlink()
-                        except Exception: pass
-                return {"ok": True, "stdout": "Trash emptied"}
-            except Exception as e:
-                return {"ok": False, "stderr": f"Empty trash failed: {e}"}
-
-        # head
-        if base == "head":
-            # usage: head [-n NUM] filename
-            n = 10
-            args = parts[1:]
-            if args and args[0] == "-n" and len(args) > 1:
-                try:
-                    n = int(args[1])
-                    args = args[2:]
-                except Exception:
-                    return {"ok": False, "stderr": "Invalid number for -n"}
-            if not args:
-                return {"ok": False, "stderr": "head requires a filename"}
-            target = safe_path(args[0], base_dir=CURRENT_DIR)
-            if not target.exists() or not target.is_file():
-                return {"ok": False, "stderr": f"File not found: {args[0]}"}
-            try:
-                lines = _read_file_lines(target, max_lines=n)
-                return {"ok": True, "stdout": "\n".join(lines)}
-            except Exception as e:
-                return {"ok": False, "stderr": f"head failed: {e}"}
-
-        # tail
-        if base == "tail":
-            # usage: tail [-n NUM] filename
-            n = 10
-            args = parts[1:]
-            if args and args[0] == "-n" and len(args) > 1:
-                try:
-                    n = int(args[1])
-                    args = args[2:]
-                except Exception:
-                    return {"ok": False, "stderr": "Invalid number for -n"}
-            if not args:
-                return {"ok": False, "stderr": "tail requires a filename"}
-            target = safe_path(args[0], base_dir=CURRENT_DIR)
-            if not target.exists() or not target.is_file():
-                return {"ok": False, "stderr": f"File not found: {args[0]}"}
+async def _h_cd(parts: list, session: SessionState) -> Dict:
+    target = parts[1] if len(parts) > 1 else "."
+    newp = _fast_safe_path(target, str(session.cwd))
+    if os.path.isdir(newp):
+        session.cwd = Path(newp)
+        return {"ok": True, "stdout": str(session.cwd)}
+    else:
+        return {"ok": False, "stderr": f"Directory not found: {newp}"}
+
+
+async def _h_pwd(parts: list, session: SessionState) -> Dict:
+    return {"ok": True, "stdout": str(session.cwd)}
+
+
+# stat  (portable, uses Python Path.stat)
+async def _h_stat(parts: list, session: SessionState) -> Dict:
+    # usage: stat <filename>
+    if len(parts) < 2:
+        return {"ok": False, "stderr": "stat requires a filename: stat file.txt"}
+    target = safe_path(parts[1], base_dir=session.cwd)
+    try:
+        out = await _run_io(_stat_text, target)
+    except Exception as e:
+        return {"ok": False, "stderr": f"stat failed: {e}"}
+    if out is None:
+        return {"ok": False, "stderr": f"File not found: {parts[1]}"}
+    return {"ok": True, "stdout": out}
+
+
+# read (alias of cat)
+async def _h_read(parts: list, session: SessionState) -> Dict:
+    if len(parts) < 2:
+        return {"ok": False, "stderr": "read requires a filename"}
+    target = safe_path(parts[1], base_dir=session.cwd)
+    if not target.is_file():
+        return {"ok": False, "stderr": f"File not found: {target.name}"}
+    try:
+        text = await _run_io(functools.partial(target.read_text, encoding="utf8"))
+        return {"ok": True, "stdout": text}
+    except Exception as e:
+        return {"ok": False, "stderr": f"Could not read file: {e}"}
+
+
+async def _h_write(parts: list, session: SessionState) -> Dict:
+    if len(parts) < 3:
+        return {"ok": False, "stderr": "write requires a filename and text: write filename Hello"}
+    fname = parts[1]; content = " ".join(parts[2:])
+    target = safe_path(fname, base_dir=session.cwd)
+    try:
+        await _run_io(_write_file, target, content)
+        return {"ok": True, "stdout": f"Wrote {target.name}"}
+    except Exception as e:
+        return {"ok": False, "stderr": f"Write failed: {e}"}
+
+
+async def _h_append(parts: list, session: SessionState) -> Dict:
+    if len(parts) < 3:
+        return {"ok": False, "stderr": "append requires a filename and text"}
+    fname = parts[1]; content = " ".join(parts[2:])
+    target = safe_path(fname, base_dir=session.cwd)
+    try:
+        await _run_io(_append_file, target, content)
+        return {"ok": True, "stdout": f"Appended to {target.name}"}
+    except Exception as e:
+        return {"ok": False, "stderr": f"Append failed: {e}"}
+
+
+# rm (safe move to trash or permanent)
+def _rm_targets(targets: list, cwd: Path, recursive: bool, permanent: bool, confirm: bool) -> Dict:
+    out_lines = []
+    for t in targets:
+        tgt = safe_path(t, base_dir=cwd)
+        if not tgt.exists():
+            out_lines.append(f"{t}: not found"); continue
+        if tgt.is_dir() and not recursive and not permanent:
+            out_lines.append(f"{t}: is a directory (use -r or --permanent --yes-i-know)"); continue
+        if not permanent:
             try:
-                lines = _tail_file_lines(target, n=n)
-                return {"ok": True, "stdout": "\n".join(lines)}
+                msg = _move_to_trash(tgt)
+                out_lines.append(msg)
             except Exception as e:
-                return {"ok": False, "stderr": f"tail failed: {e}"}
-
-        # grep
-        if base == "grep":
-            # usage: grep [-i] [-E] pattern filename
-            flags = parts[1:]
-            ignore_case = False
-            use_regex = False
-            pat = None
-            fname = None
-            # parse flags
-            i = 0
-            while i < len(flags) and flags[i].startswith("-"):
-                if flags[i] == "-i":
-                    ignore_case = True
-                elif flags[i] == "-E":
-                    use_regex = True
-                else:
-                    pass
-                i += 1
-            rest = flags[i:]
-            if len(rest) < 2:
-                return {"ok": False, "stderr": "usage: grep [-i] [-E] pattern filename"}
-            pat = rest[0]
-            fname = rest[1]
-            target = safe_path(fname, base_dir=CURRENT_DIR)
-            if not target.exists() or not target.is_file():
-                return {"ok": False, "stderr": f"File not found: {fname}"}
+                out_lines.append(f"{t}: failed to move to trash: {e}")
+        else:
+            if not confirm:
+                return {"ok": False, "stderr": "Permanent delete requires --yes-i-know flag alongside --permanent"}
             try:
-                matches = _grep_in_file(target, pat, ignore_case=ignore_case, use_regex=use_regex)
-                if not matches:
-                    return {"ok": True, "stdout": ""}
-                return {"ok": True, "stdout": "\n".join(matches)}
+                if tgt.is_dir(): shutil.rmtree(tgt)
+                else: tgt.unlink()
+                out_lines.append(f"Deleted permanently: {t}")
             except Exception as e:
-                return {"ok": False, "stderr": f"grep failed: {e}"}
-
-        # find (search filenames under current dir; simple and safe)
-        if base == "find":
-            # usage: find [path] [-maxdepth N] [-name pattern]
-            args = parts[1:] or ["."]
-            start = "."
-            maxdepth = 4
-            name_pat = None
-            i = 0
-            if args:
-                if not args[0].startswith("-"):
-                    start = args[0]
-                    i = 1
-            while i < len(args):
-                a = args[i]
-                if a == "-maxdepth" and i+1 < len(args):
-                    try:
-                        maxdepth = int(args[i+1])
-                    except Exception:
-                        pass
-                    i += 2
-                elif a == "-name" and i+1 < len(args):
-                    name_pat = args[i+1]
-                    i += 2
+                out_lines.append(f"{t}: delete failed: {e}")
+    return {"ok": True, "stdout": "\n".join(out_lines)}
+
+
+async def _h_rm(parts: list, session: SessionState) -> Dict:
+    recursive = False; permanent = False; confirm = False; targets = []
+    for tok in parts[1:]:
+        if tok in ("-r", "-R", "--recursive"): recursive = True
+        elif tok in ("--permanent", "--perma"): permanent = True
+        elif tok == "--yes-i-know": confirm = True
+        else: targets.append(tok)
+    if not targets:
+        return {"ok": False, "stderr": "rm requires at least one target filename or directory"}
+    return await _run_io(_rm_targets, targets, session.cwd, recursive, permanent, confirm)
+
+
+async def _h_mv(parts: list, session: SessionState) -> Dict:
+    if len(parts) < 3:
+        return {"ok": False, "stderr": "mv requires source and destination: mv src dest"}
+    src = safe_path(parts[1], base_dir=session.cwd)
+    dest = safe_path(parts[2], base_dir=session.cwd)
+    if not src.exists():
+        return {"ok": False, "stderr": f"Source not found: {parts[1]}"}
+    msg = await _run_io(_safe_mv, src, dest)
+    return {"ok": True, "stdout": msg}
+
+
+# cp (supports -r flag for directories)
+async def _h_cp(parts: list, session: SessionState) -> Dict:
+    recursive = False
+    args = parts[1:]
+    if '-r' in args:
+        recursive = True
+        args = [a for a in args if a != '-r']
+    if len(args) < 2:
+        return {"ok": False, "stderr": "cp requires source and destination (use -r for directories)"}
+    src = safe_path(args[0], base_dir=session.cwd)
+    dest = safe_path(args[1], base_dir=session.cwd)
+    if not src.exists():
+        return {"ok": False, "stderr": f"Source not found: {args[0]}"}
+    msg = await _run_io(_safe_cp, src, dest, recursive)
+    return {"ok": True, "stdout": msg}
+
+
+# restore <name>
+async def _h_restore(parts: list, session: SessionState) -> Dict:
+    if len(parts) < 2:
+        return {"ok": False, "stderr": "restore requires a filename present in .trash/"}
+    name = parts[1]
+    msg = await _run_io(_restore_from_trash, name, session.cwd)
+    return {"ok": True, "stdout": msg}
+
+
+# empty-trash --yes-i-know
+def _empty_trash() -> Dict:
+    trash = TRASH_DIR
+    if not trash.exists():
+        return {"ok": True, "stdout": "Trash is already empty"}
+    try:
+        # DirEntry types come from readdir, so top-level items need no extra stat
+        with os.scandir(trash) as it:
+            for item in it:
+                if item.is_dir(follow_symlinks=False):
+                    shutil.rmtree(item.path, ignore_errors=True)
                 else:
-                    i += 1
-            start_path = safe_path(start, base_dir=CURRENT_DIR)
-            out = []
+                    try: os.unlink(item.path)
+                    except Exception: pass
+        return {"ok": True, "stdout": "Trash emptied"}
+    except Exception as e:
+        return {"ok": False, "stderr": f"Empty trash failed: {e}"}
+
+
+async def _h_empty_trash(parts: list, session: SessionState) -> Dict:
+    if len(parts) < 2 or parts[1] != "--yes-i-know":
+        return {"ok": False, "stderr": "empty-trash is destructive. To confirm run: empty-trash --yes-i-know"}
+    return await _run_io(_empty_trash)
+
+
+async def _h_head(parts: list, session: SessionState) -> Dict:
+    # usage: head [-n NUM] filename
+    n = 10
+    args = parts[1:]
+    if args and args[0] == "-n" and len(args) > 1:
+        try:
+            n = int(args[1])
+            args = args[2:]
+        except Exception:
+            return {"ok": False, "stderr": "Invalid number for -n"}
+    if not args:
+        return {"ok": False, "stderr": "head requires a filename"}
+    target = safe_path(args[0], base_dir=session.cwd)
+    if not target.is_file():
+        return {"ok": False, "stderr": f"File not found: {args[0]}"}
+    try:
+        lines = await _run_io(_read_file_lines, target, n)
+        return {"ok": True, "stdout": "\n".join(lines)}
+    except Exception as e:
+        return {"ok": False, "stderr": f"head failed: {e}"}
+
+
+async def _h_tail(parts: list, session: SessionState) -> Dict:
+    # usage: tail [-n NUM] filename
+    n = 10
+    args = parts[1:]
+    if args and args[0] == "-n" and len(args) > 1:
+        try:
+            n = int(args[1])
+            args = args[2:]
+        except Exception:
+            return {"ok": False, "stderr": "Invalid number for -n"}
+    if not args:
+        return {"ok": False, "stderr": "tail requires a filename"}
+    target = safe_path(args[0], base_dir=session.cwd)
+    if not target.is_file():
+        return {"ok": False, "stderr": f"File not found: {args[0]}"}
+    try:
+        lines = await _run_io(_tail_file_lines, target, n)
+        return {"ok": True, "stdout": "\n".join(lines)}
+    except Exception as e:
+        return {"ok": False, "stderr": f"tail failed: {e}"}
+
+
+async def _h_grep(parts: list, session: SessionState) -> Dict:
+    # usage: grep [-i] [-E] pattern file...
+    flags = parts[1:]
+    ignore_case = False
+    use_regex = False
+    pat = None
+    fname = None
+    # parse flags
+    i = 0
+    while i < len(flags) and flags[i].startswith("-"):
+        if flags[i] == "-i":
+            ignore_case = True
+        elif flags[i] == "-E":
+            use_regex = True
+        else:
+            pass
+        i += 1
+    rest = flags[i:]
+    if len(rest) < 2:
+        return {"ok": False, "stderr": "usage: grep [-i] [-E] pattern file..."}
+    pat = rest[0]
+    operands = _expand_operands(rest[1:], session.cwd)
+    if len(operands) == 1:
+        fname, target = operands[0]
+        if not target.is_file():
+            return {"ok": False, "stderr": f"File not found: {fname}"}
+        try:
+            matches = await _run_io(_grep_in_file, target, pat, ignore_case, use_regex)
+            if not matches:
+                return {"ok": True, "stdout": ""}
+            return {"ok": True, "stdout": "\n".join(matches)}
+        except Exception as e:
+            return {"ok": False, "stderr": f"grep failed: {e}"}
+    # several files: scan them concurrently on the I/O pool, prefix hits with the file name
+    found = [(fname, target) for fname, target in operands if target.is_file()]
+    err = [f"File not found: {fname}" for fname, target in operands if not target.is_file()]
+    results = await asyncio.gather(
+        *(_run_io(_grep_in_file, target, pat, ignore_case, use_regex) for _, target in found),
+        return_exceptions=True,
+    )
+    out = []
+    for (fname, _), res in zip(found, results):
+        if isinstance(res, BaseException):
+            err.append(f"{fname}: grep failed: {res}")
+        else:
+            out.extend(f"{fname}:{m}" for m in res)
+    return {"ok": not err, "stdout": "\n".join(out), "stderr": "\n".join(err)}
+
+
+def _expand_operands(args: list, cwd: Path) -> list:
+    """
+    (name as typed/matched, sandboxed Path) for each file operand. There is no shell, so
+    wildcards are expanded here, relative to cwd; patterns that are absolute or climb with ".."
+    are taken literally, and matches that resolve outside the sandbox are dropped.
+    """
+    out = []
+    # glob's root_dir= needs Python 3.10, so glob under the escaped cwd and strip it off again
+    base = os.path.join(str(cwd), "")
+    escaped = os.path.join(glob.escape(str(cwd)), "")
+    for a in args:
+        if any(c in a for c in "*?[") and not os.path.isabs(a) and ".." not in Path(a).parts:
+            hits = [h[len(base):] for h in sorted(glob.glob(escaped + a))
+                    if os.path.realpath(h).startswith(_ROOT_STR)]
+            if hits:
+                out.extend((h, safe_path(h, base_dir=cwd)) for h in hits)
+                continue
+        out.append((a, safe_path(a, base_dir=cwd)))
+    return out
+
+
+# find (search filenames under current dir; simple and safe)
+async def _h_find(parts: list, session: SessionState) -> Dict:
+    # usage: find [path] [-maxdepth N] [-name pattern]
+    args = parts[1:] or ["."]
+    start = "."
+    maxdepth = 4
+    name_pat = None
+    i = 0
+    if args:
+        if not args[0].startswith("-"):
+            start = args[0]
+            i = 1
+    while i < len(args):
+        a = args[i]
+        if a == "-maxdepth" and i+1 < len(args):
             try:
-                for root, dirs, files in os.walk(start_path):
-                    rel_root = Path(root)
-                    try:
-                        depth = len(rel_root.resolve().relative_to(start_path.resolve()).parts) if start_path.resolve() != rel_root.resolve() else 0
-                    except Exception:
-                        depth = 0
-                    if depth > maxdepth:
-                        # prune dirs
-                        dirs[:] = []
-                        continue
-                    for f in files:
-                        if name_pat:
-                            if name_pat in f:
-                                out.append(str(Path(root) / f).replace(str(ROOT) + os.sep, ""))
-                        else:
-                            out.append(str(Path(root) / f).replace(str(ROOT) + os.sep, ""))
-                return {"ok": True, "stdout": "\n".join(out)}
-            except Exception as e:
-                return {"ok": False, "stderr": f"find failed: {e}"}
-
-        # tree
-        if base == "tree":
-            # usage: tree [path] [-L depth]
-            args = parts[1:]
-            start = CURRENT_DIR
-            max_depth = 3
-            if args:
-                if not args[0].startswith("-"):
-                    start = safe_path(args[0], base_dir=CURRENT_DIR)
-                if "-L" in args:
-                    try:
-                        li = args.index("-L")
-                        max_depth = int(args[li+1])
-                    except Exception:
-                        pass
+                maxdepth = int(args[i+1])
+            except Exception:
+                pass
+            i += 2
+        elif a == "-name" and i+1 < len(args):
+            name_pat = args[i+1]
+            i += 2
+        else:
+            i += 1
+    start_path = safe_path(start, base_dir=session.cwd)
+    try:
+        files = await _run_io(_find_files, start_path, maxdepth, name_pat)
+        return {"ok": True, "stdout": "\n".join(files)}
+    except Exception as e:
+        return {"ok": False, "stderr": f"find failed: {e}"}
+
+
+async def _h_tree(parts: list, session: SessionState) -> Dict:
+    # usage: tree [path] [-L depth]
+    args = parts[1:]
+    start = session.cwd
+    max_depth = 3
+    if args:
+        if not args[0].startswith("-"):
+            start = safe_path(args[0], base_dir=session.cwd)
+        if "-L" in args:
             try:
-                out = _tree_listing(start, max_depth)
-                return {"ok": True, "stdout": "\n".join(out)}
-            except Exception as e:
-                return {"ok": False, "stderr": f"tree failed: {e}"}
-
-        # md5 / sha256
-        if base in ("md5", "sha256"):
-            if len(parts) < 2:
-                return {"ok": False, "stderr": f"{base} requires a filename"}
-            target = safe_path(parts[1], base_dir=CURRENT_DIR)
-            if not target.exists() or not target.is_file():
-                return {"ok": False, "stderr": f"File not found: {parts[1]}"}
-            algo = "md5" if base == "md5" else "sha256"
-            digest = _compute_hash(target, algo=algo)
-            if digest is None:
-                return {"ok": False, "stderr": f"{algo} computation failed"}
-            return {"ok": True, "stdout": f"{digest}  {target.name}"}
-
-        # wc
-        if base == "wc":
-            # usage: wc [-l|-w|-c] filename
-            args = parts[1:]
-            mode = None
-            fname = None
-            if len(args) == 1:
-                fname = args[0]
-            elif len(args) == 2:
-                mode = args[0]
-                fname = args[1]
-            else:
-                return {"ok": False, "stderr": "usage: wc [-l|-w|-c] filename"}
-            target = safe_path(fname, base_dir=CURRENT_DIR)
-            if not target.exists() or not target.is_file():
-                return {"ok": False, "stderr": f"File not found: {fname}"}
-            counts = _wc_counts(target)
-            if counts is None:
-                return {"ok": False, "stderr": "wc failed to read file"}
-            if mode == "-l":
-                return {"ok": True, "stdout": str(counts["lines"])}
-            if mode == "-w":
-                return {"ok": True, "stdout": str(counts["words"])}
-            if mode == "-c":
-                return {"ok": True, "stdout": str(counts["chars"])}
-            # default: lines words chars
-            return {"ok": True, "stdout": f"{counts['lines']} {counts['words']} {counts['chars']} {target.name}"}
-
-        # fallback: run as subprocess (Popen) so kill works
-        safe_parts = []
-        for p in parts:
-            if p.startswith("-"):
-                safe_parts.append(p)
-            elif any(c in p for c in ("/", "\\", ".", "~")) or (not p.isalpha() and len(p) > 0):
-                sp = safe_path(p, base_dir=CURRENT_DIR)
-                safe_parts.append(str(sp))
-            else:
-                safe_parts.append(p)
+                li = args.index("-L")
+                max_depth = int(args[li+1])
+            except Exception:
+                pass
+    try:
+        out = await _run_io(_tree_listing, start, max_depth)
+        return {"ok": True, "stdout": "\n".join(out)}
+    except Exception as e:
+        return {"ok": False, "stderr": f"tree failed: {e}"}
+
 
-        if os.name == "nt":
-            args = windows_translate(safe_parts)
+# md5 / sha256
+async def _h_hash(parts: list, session: SessionState) -> Dict:
+    base = parts[0].lower()
+    if len(parts) < 2:
+        return {"ok": False, "stderr": f"{base} requires a filename"}
+    algo = "md5" if base == "md5" else "sha256"
+    operands = _expand_operands(parts[1:], session.cwd)
+    if len(operands) == 1:
+        fname, target = operands[0]
+        if not target.is_file():
+            return {"ok": False, "stderr": f"File not found: {fname}"}
+        digest = await _run_io(_compute_hash, target, algo)
+        if digest is None:
+            return {"ok": False, "stderr": f"{algo} computation failed"}
+        return {"ok": True, "stdout": f"{digest}  {target.name}"}
+    # several files: hash them concurrently so the disk sees more than one read in flight
+    found = [(fname, target) for fname, target in operands if target.is_file()]
+    err = [f"File not found: {fname}" for fname, target in operands if not target.is_file()]
+    digests = await asyncio.gather(*(_run_io(_compute_hash, target, algo) for _, target in found))
+    out = []
+    for (fname, _), digest in zip(found, digests):
+        if digest is None:
+            err.append(f"{fname}: {algo} computation failed")
         else:
-            args = safe_parts
+            out.append(f"{digest}  {fname}")
+    return {"ok": not err, "stdout": "\n".join(out), "stderr": "\n".join(err)}
+
+
+_WC_MODES = {"-l": "lines", "-w": "words", "-c": "chars"}
+
+
+async def _h_wc(parts: list, session: SessionState) -> Dict:
+    # usage: wc [-l|-w|-c] filename
+    args = parts[1:]
+    mode = None
+    fname = None
+    if len(args) == 1:
+        fname = args[0]
+    elif len(args) == 2:
+        mode = args[0]
+        fname = args[1]
+    else:
+        return {"ok": False, "stderr": "usage: wc [-l|-w|-c] filename"}
+    target = safe_path(fname, base_dir=session.cwd)
+    if not target.is_file():
+        return {"ok": False, "stderr": f"File not found: {fname}"}
+    key = _WC_MODES.get(mode)
+    counts = await _run_io(_wc_counts, target, (key,) if key else _WC_ALL)
+    if counts is None:
+        return {"ok": False, "stderr": "wc failed to read file"}
+    if key:
+        return {"ok": True, "stdout": str(counts[key])}
+    # default: lines words chars
+    return {"ok": True, "stdout": f"{counts['lines']} {counts['words']} {counts['chars']} {target.name}"}
 
-        res = _spawn_and_wait(args, cwd=CURRENT_DIR)
-        if len(res.get("stdout","")) > MAX_OUTPUT_CHARS:
-            res["stdout"] = res["stdout"][:MAX_OUTPUT_CHARS] + "\n[truncated output]"
-        if len(res.get("stderr","")) > MAX_OUTPUT_CHARS:
-            res["stderr"] = res["stderr"][:MAX_OUTPUT_CHARS] + "\n[truncated stderr]"
-        return res
 
+# ---- In-process versions of common external commands ----
+# These skip a child process (and PowerShell's cold start on Windows) for the plain forms;
+# anything with other flags or operands still goes through _run_fallback.
+def _list_dir(path: str):
+    return sorted(n for n in os.listdir(path) if not n.startswith("."))
+
+
+def _read_capped(path: Path) -> str:
+    with path.open("rb") as fh:
+        return _decode_capped(fh.read(CAPTURE_BYTES + 1), "[truncated output]")
+
+
+async def _h_ls(parts: list, session: SessionState) -> Dict:
+    args = parts[1:]
+    if len(args) > 1 or (args and args[0].startswith("-")):
+        return await _run_fallback(parts, session)
+    target = _fast_safe_path(args[0], str(session.cwd)) if args else str(session.cwd)
+    if os.path.isdir(target):
+        names = await _run_io(_list_dir, target)
+        return {"ok": True, "stdout": "".join(n + "\n" for n in names)}
+    if os.path.exists(target):
+        return {"ok": True, "stdout": args[0] + "\n"}
+    return {"ok": False, "stderr": f"{parts[0]}: cannot access '{args[0] if args else '.'}': No such file or directory\n"}
+
+
+async def _h_cat(parts: list, session: SessionState) -> Dict:
+    args = parts[1:]
+    if not args or any(a.startswith("-") for a in args):
+        return await _run_fallback(parts, session)
+    out, err = [], []
+    for a in args:
+        target = safe_path(a, base_dir=session.cwd)
+        if not target.is_file() and not target.is_dir():
+            err.append(f"{parts[0]}: {a}: No such file or directory\n")
+            continue
+        try:
+            out.append(await _run_io(_read_capped, target))
+        except OSError as e:
+            # directories land here as IsADirectoryError, reported the way coreutils does
+            err.append(f"{parts[0]}: {a}: {e.strerror}\n")
+    return {"ok": not err, "stdout": _cap("".join(out), "[truncated output]"), "stderr": "".join(err)}
+
+
+def _fs_each(parts: list, cwd: Path, op, what: str) -> Dict:
+    # apply op to every operand, collecting coreutils-style errors instead of stopping at the first
+    err = []
+    for a in parts[1:]:
+        try:
+            op(safe_path(a, base_dir=cwd))
+        except OSError as e:
+            err.append(f"{parts[0]}: {what} '{a}': {e.strerror}\n")
+    return {"ok": not err, "stdout": "", "stderr": "".join(err)}
+
+
+def _touch(p: Path):
+    # like coreutils: existing paths (directories, read-only files) only get their times bumped
+    try:
+        os.utime(p)
+    except FileNotFoundError:
+        os.close(os.open(p, os.O_WRONLY | os.O_CREAT, 0o666))
+
+
+async def _h_mkdir(parts: list, session: SessionState) -> Dict:
+    args = parts[1:]
+    parents = "-p" in args
+    if parents:
+        args = [a for a in args if a != "-p"]
+    if not args or any(a.startswith("-") for a in args):
+        return await _run_fallback(parts, session)
+    op = functools.partial(os.makedirs, exist_ok=True) if parents else os.mkdir
+    return await _run_io(_fs_each, [parts[0]] + args, session.cwd, op, "cannot create directory")
+
+
+async def _h_rmdir(parts: list, session: SessionState) -> Dict:
+    if len(parts) < 2 or any(a.startswith("-") for a in parts[1:]):
+        return await _run_fallback(parts, session)
+    return await _run_io(_fs_each, parts, session.cwd, os.rmdir, "failed to remove")
+
+
+async def _h_touch(parts: list, session: SessionState) -> Dict:
+    if len(parts) < 2 or any(a.startswith("-") for a in parts[1:]):
+        return await _run_fallback(parts, session)
+    return await _run_io(_fs_each, parts, session.cwd, _touch, "cannot touch")
+
+
+async def _h_echo(parts: list, session: SessionState) -> Dict:
+    if len(parts) > 1 and parts[1] in ("-n", "-e", "-E"):
+        return await _run_fallback(parts, session)
+    return {"ok": True, "stdout": " ".join(parts[1:]) + "\n"}
+
+
+async def _h_whoami(parts: list, session: SessionState) -> Dict:
+    if len(parts) > 1:
+        return await _run_fallback(parts, session)
+    return {"ok": True, "stdout": getpass.getuser() + "\n"}
+
+
+async def _h_uname(parts: list, session: SessionState) -> Dict:
+    if len(parts) > 1:
+        return await _run_fallback(parts, session)
+    return {"ok": True, "stdout": platform.system() + "\n"}
+
+
+# fallback: run as subprocess (asyncio) so kill works
+async def _run_fallback(parts: list, session: SessionState) -> Dict:
+    # session state and the resolver are bound to locals once, not looked up per argument
+    cwd_str = str(session.cwd)
+    resolve = _fast_safe_path
+    # flags pass through; path characters (/ \ . ~) are never alphabetic, so a single
+    # isalpha() covers both "looks like a path" checks
+    safe_parts = [p if not p or p.startswith("-") or p.isalpha() else resolve(p, cwd_str) for p in parts]
+
+    return await _spawn_and_wait(_translate(safe_parts, session.cwd), session)
+
+
+# dispatch table: command name -> async handler(parts, session)
+_HANDLERS = {
+    "help": _h_help,
+    "ps": _h_stats,
+    "stats": _h_stats,
+    "cd": _h_cd,
+    "pwd": _h_pwd,
+    "stat": _h_stat,
+    "read": _h_read,
+    "write": _h_write,
+    "append": _h_append,
+    "rm": _h_rm,
+    "mv": _h_mv,
+    "cp": _h_cp,
+    "restore": _h_restore,
+    "empty-trash": _h_empty_trash,
+    "head": _h_head,
+    "tail": _h_tail,
+    "grep": _h_grep,
+    "find": _h_find,
+    "tree": _h_tree,
+    "md5": _h_hash,
+    "sha256": _h_hash,
+    "wc": _h_wc,
+    "ls": _h_ls,
+    "dir": _h_ls,
+    "cat": _h_cat,
+    "type": _h_cat,
+    "echo": _h_echo,
+    "whoami": _h_whoami,
+    "uname": _h_uname,
+    "mkdir": _h_mkdir,
+    "rmdir": _h_rmdir,
+    "touch": _h_touch,
+}
+
+
+# ---- Core command runner ----
+# quotes, backslashes, or whitespace that str.split() breaks on but shlex does not
+_NEEDS_SHLEX = re.compile(r"[\"'\\]|[^\S \t\r\n]")
+
+
+def _fast_split(cmd: str) -> list:
+    """shlex.split for commands that need it; plain str.split() (same tokens) for the rest."""
+    if _NEEDS_SHLEX.search(cmd):
+        return shlex.split(cmd, posix=not _IS_WINDOWS)
+    return cmd.split()
+
+
+async def run_whitelisted_command(cmd: str, session: SessionState) -> Dict:
+    try:
+        parts = _fast_split(cmd)
+        if len(parts) == 0:
+            return {"ok": False, "stderr": "Empty command."}
+        base = parts[0].lower()
+        if base not in WHITELIST:
+            return {"ok": False, "stderr": f"Command '{base}' not allowed."}
+        # one dict lookup instead of walking an if-chain; every handler is a coroutine function
+        handler = _HANDLERS.get(base, _run_fallback)
+        return await handler(parts, session)
     except Exception as e:
         return {"ok": False, "stderr": f"Error: {e}"}
 
 
+# fixed replies are serialized once; per-command results are dumped straight into a Response
+_NO_PROC_JSON = _dumps({"ok": False, "stderr": "No running process to kill."})
+_KILL_SENT_JSON = _dumps({"ok": True, "stdout": "Kill signal sent."})
+_NO_COMMAND_JSON = _dumps({"ok": False, "stderr": "No command provided."})
+_BAD_BODY_JSON = _dumps({"ok": False, "stderr": 'Request body must be JSON like {"command": "..."}.'})
+
+
 @app.post("/api/kill")
-async def api_kill(_req: Request):
-    global CURRENT_PROCESS
-    with PROCESS_LOCK:
-        proc = CURRENT_PROCESS
+async def api_kill(req: Request):
+    session = req.state.session
+    if session is None:
+        # no session yet means nothing has been started for this caller
+        return Response(content=_NO_PROC_JSON, media_type="application/json")
+    async with session.lock:
+        proc = session.current_proc
         if not proc:
-            return JSONResponse({"ok": False, "stderr": "No running process to kill."})
+            return Response(content=_NO_PROC_JSON, media_type="application/json")
+        try:
+            proc.terminate()
+        except Exception:
+            pass
         try:
+            # returns as soon as the child exits instead of always sleeping out the grace period
+            await asyncio.wait_for(proc.wait(), KILL_GRACE)
+        except asyncio.TimeoutError:
             try:
-                proc.terminate()
+                proc.kill()
             except Exception:
                 pass
-            time.sleep(0.2)
-            if proc.poll() is None:
-                try:
-                    proc.kill()
-                except Exception:
-                    pass
-            return JSONResponse({"ok": True, "stdout": "Kill signal sent."})
-        finally:
-            pass
+        return Response(content=_KILL_SENT_JSON, media_type="application/json")
 
 
 @app.post("/api/command")
 async def api_command(req: Request):
-    payload = await req.json()
-    cmd = payload.get("command", "").strip()
+    try:
+        payload = _loads(await req.body())
+        cmd = payload.get("command", "").strip()
+    except (ValueError, AttributeError):
+        # malformed JSON (orjson/json decode errors are ValueErrors) or not a {"command": str} object
+        return Response(content=_BAD_BODY_JSON, status_code=400, media_type="application/json")
     if not cmd:
-        return JSONResponse({"ok": False, "stderr": "No command provided."})
-    res = run_whitelisted_command(cmd)
-    return JSONResponse(res)
+        return Response(content=_NO_COMMAND_JSON, media_type="application/json")
+    res = await run_whitelisted_command(cmd, _session_for(req))
+    return Response(content=_dumps(res), media_type="application/json")
 
 
 # New endpoint: return whitelist so frontend can fetch it
 @app.get("/api/whitelist")
 async def api_whitelist():
-    return JSONResponse({"allowed": sorted(list(WHITELIST))})
+    return Response(content=_WL_JSON, media_type="application/json")
 
 
 # Serve index.html at root (so visiting / shows your frontend)
+INDEX_PATH = Path.cwd() / "index.html"
+_INDEX_NOT_FOUND = b"<html><body><h3>index.html not found</h3></body></html>"
+_INDEX_CACHE = {"body": _INDEX_NOT_FOUND, "etag": None}
+
+
+@app.on_event("startup")
+def _load_index():
+    """Read index.html once; / then answers from memory (or 304) without touching the disk."""
+    try:
+        # decoded and re-encoded so invalid bytes are replaced exactly as before
+        body = INDEX_PATH.read_bytes().decode("utf-8", errors="replace").encode("utf-8")
+    except OSError:
+        _INDEX_CACHE["body"], _INDEX_CACHE["etag"] = _INDEX_NOT_FOUND, None
+        return
+    _INDEX_CACHE["body"], _INDEX_CACHE["etag"] = body, '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
 @app.get("/", response_class=HTMLResponse)
-async def root_index():
-    index_path = Path.cwd() / "index.html"
-    if index_path.exists():
-        try:
-            return HTMLResponse(index_path.read_text(encoding="utf8"))
-        except UnicodeDecodeError:
-            data = index_path.read_bytes()
-            return HTMLResponse(data.decode("utf-8", errors="replace"))
-    return HTMLResponse("<html><body><h3>index.html not found</h3></body></html>")
+async def root_index(request: Request):
+    etag = _INDEX_CACHE["etag"]
+    if etag is None:
+        return HTMLResponse(_INDEX_CACHE["body"])
+    # no-cache: browsers revalidate every load, so a redeployed index.html is picked up after restart
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(_INDEX_CACHE["body"], headers=headers)
@@ -0,0 +1,29 @@
+# server.py
+# Production launcher: uvicorn with uvloop + httptools (both come with uvicorn[standard];
+# uvloop has no Windows build, so there the default asyncio loop is used).
+#
+# Sessions (cwd, running process) live in each worker's memory, so with WORKERS > 1 a
+# client's requests must keep landing on the same worker — put a cookie-sticky proxy in
+# front, or keep the default of one worker.
+import importlib.util
+import os
+
+import uvicorn
+
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", "8000"))
+WORKERS = int(os.environ.get("WORKERS", "1"))
+LOOP = "uvloop" if importlib.util.find_spec("uvloop") else "auto"
+HTTP = "httptools" if importlib.util.find_spec("httptools") else "auto"
+
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "app:app",
+        host=HOST,
+        port=PORT,
+        workers=WORKERS,
+        loop=LOOP,
+        http=HTTP,
+        reload=False,
+    )
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+REPO = Path(__file__).resolve().parent.parent
+
+# app.py builds its sandbox/ and static/ paths from the working directory at import time,
+# so import it from a scratch directory instead of the checkout.
+_WORK = tempfile.mkdtemp(prefix="sandbox-tests-")
+os.chdir(_WORK)
+os.makedirs("static", exist_ok=True)
+sys.path.insert(0, str(REPO))
+
+import app as app_module  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app_module.app) as c:
+        yield c
+
+
+@pytest.fixture
+def run(client, request):
+    """Run commands inside a fresh directory of the sandbox; returns the JSON result."""
+    name = request.node.name.replace("[", "_").replace("]", "")
+    workdir = app_module.ROOT / name
+    workdir.mkdir()
+
+    def _run(command: str) -> dict:
+        r = client.post("/api/command", json={"command": command})
+        assert r.status_code == 200, r.text
+        return r.json()
+
+    assert _run(f"cd {name}")["ok"]
+    _run.dir = workdir
+    yield _run
+    _run("cd /")
@@ -0,0 +1,161 @@
+def test_cp_onto_itself_keeps_source(run):
+    (run.dir / "same.txt").write_text("precious data\n")
+    (run.dir / "dd").mkdir()
+    (run.dir / "dd" / "same.txt").write_text("inner\n")
+    for command in ("cp same.txt same.txt", "cp same.txt ./same.txt", "cp dd/same.txt dd"):
+        res = run(command)
+        assert "Copied:" not in res["stdout"], res
+    assert (run.dir / "same.txt").read_text() == "precious data\n"
+    assert (run.dir / "dd" / "same.txt").read_text() == "inner\n"
+
+
+def test_concurrent_rm_of_same_name_keeps_every_trashed_file(run):
+    import asyncio
+    import app
+
+    count = 256
+    dirs = []
+    for i in range(count):
+        d = run.dir / f"d{i}"
+        d.mkdir()
+        (d / "log.txt").write_text(f"log {i}\n")
+        dirs.append(d)
+
+    async def rm_all():
+        return await asyncio.gather(*(app._run_io(app._rm_targets, ["log.txt"], d, False, False, False) for d in dirs))
+
+    before = {p.name for p in app.TRASH_DIR.iterdir()} if app.TRASH_DIR.exists() else set()
+    asyncio.run(rm_all())
+    new = [p for p in app.TRASH_DIR.iterdir() if p.name not in before]
+    assert sorted(p.read_text() for p in new) == sorted(f"log {i}\n" for i in range(count))
+
+
+def _grep_lines(text, pattern, ignore_case=False):
+    """Reference: search each line on its own, like grep."""
+    import re
+    rx = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+    return [f"{i}:{ln}" for i, ln in enumerate(text.splitlines(), start=1) if rx.search(ln)]
+
+
+def test_grep_regex_keeps_per_line_semantics(run):
+    import app
+
+    text = "ab\nab x\n a\nxa\nab\nb a\nend\n"
+    path = run.dir / "g.txt"
+    path.write_text(text)
+    for pattern in (r"\Aab", r"b\Z", r"(?<=\s)a", r"(?<=\n)a", r"(?<!\n)a", r"(?<!\s)a",
+                    r"b(?=\n)", r"b(?!\n)", r"b\s+a", r"^a|x$", r"a[^x]*x"):
+        assert app._grep_in_file(path, pattern, use_regex=True) == _grep_lines(text, pattern), pattern
+    assert app._grep_in_file(path, r"\AAB", ignore_case=True, use_regex=True) == _grep_lines(text, r"\AAB", True)
+
+
+def test_touch_existing_directory_and_read_only_file(run):
+    import os
+
+    (run.dir / "d").mkdir()
+    (run.dir / "ro.txt").write_text("keep\n")
+    os.chmod(run.dir / "ro.txt", 0o444)
+    old = 1_000_000_000
+    os.utime(run.dir / "d", (old, old))
+    res = run("touch d ro.txt new.txt")
+    assert res["ok"], res
+    assert (run.dir / "d").stat().st_mtime > old
+    assert (run.dir / "ro.txt").read_text() == "keep\n"
+    assert (run.dir / "new.txt").is_file()
+    res = run("touch missing/x.txt")
+    assert not res["ok"] and res["stderr"] == "touch: cannot touch 'missing/x.txt': No such file or directory\n", res
+
+
+def test_ls_in_removed_cwd_and_cat_on_directory(run):
+    (run.dir / "d").mkdir()
+    (run.dir / "f.txt").write_text("hi\n")
+    res = run("cat d f.txt")
+    assert res["stderr"] == "cat: d: Is a directory\n" and res["stdout"] == "hi\n", res
+    assert run("cd d")["ok"]
+    (run.dir / "d").rmdir()
+    res = run("ls")
+    assert not res["ok"] and res["stderr"] == "ls: cannot access '.': No such file or directory\n", res
+
+
+def test_wc_counts_lines_and_chars_from_the_same_bytes(run):
+    (run.dir / "crlf.txt").write_bytes("héllo wörld\r\nsecond line\r\n".encode())
+    (run.dir / "cr.txt").write_bytes(b"one\rtwo\rthree\n")
+    (run.dir / "bad.txt").write_bytes(b"a\xff\xfeb\nc")
+    assert run("wc crlf.txt")["stdout"] == "2 4 26 crlf.txt"
+    assert run("wc cr.txt")["stdout"] == "1 3 14 cr.txt"
+    assert run("wc bad.txt")["stdout"] == "2 2 6 bad.txt"
+    assert run("wc -c crlf.txt")["stdout"] == "26"
+
+
+def test_cookieless_burst_does_not_evict_established_sessions(run, client):
+    import app
+    from fastapi.testclient import TestClient
+
+    assert run("pwd")["stdout"] == str(run.dir)  # the shared client's session is established
+    anon = TestClient(app.app)
+    for _ in range(app.MAX_SESSIONS + 10):
+        anon.cookies.clear()
+        assert anon.get("/api/whitelist").status_code == 200
+        anon.cookies.clear()
+        assert anon.post("/api/command", json={"command": "pwd"}).json()["ok"]
+    assert len(app.NEW_SESSIONS) <= app.MAX_NEW_SESSIONS
+    assert run("pwd")["stdout"] == str(run.dir)
+
+
+def test_session_created_only_by_commands(client):
+    from fastapi.testclient import TestClient
+    import app
+
+    anon = TestClient(app.app)
+    assert "sid" not in anon.get("/api/whitelist").cookies
+    assert "sid" not in anon.post("/api/kill").cookies
+    res = anon.post("/api/command", json={"command": "cd /"})
+    assert "sid" in res.cookies
+    assert anon.post("/api/command", json={"command": "pwd"}).json()["ok"]
+    assert res.cookies["sid"] in app.SESSIONS
+
+
+def test_grep_bytes_path_handles_more_hits_than_hyperscan_cap(run):
+    import app
+
+    count = app.GREP_HS_MAX_HITS + 100
+    path = run.dir / "dense.txt"
+    path.write_text("".join(f"{i} needle {'x' if i % 2 else 'y'}\n" for i in range(count)))
+    expected = [f"{i + 1}:{i} needle {'x' if i % 2 else 'y'}" for i in range(count)]
+    for ignore_case, pattern in ((False, "needle"), (True, "NEEDLE")):
+        assert app._grep_in_file_bytes(path, pattern, ignore_case) == expected
+        assert app._grep_in_file(path, pattern, ignore_case) == expected
+
+
+def test_grep_over_wildcard_prefixes_file_names(run):
+    (run.dir / "a.txt").write_text("hit one\nmiss\n")
+    (run.dir / "b.txt").write_text("miss\nhit two\n")
+    (run.dir / "c.log").write_text("hit three\n")
+    res = run("grep hit *.txt")
+    assert res["ok"] and res["stdout"] == "a.txt:1:hit one\nb.txt:2:hit two", res
+
+
+def test_hash_several_files_reports_missing_operand(run):
+    import hashlib
+
+    (run.dir / "a").write_bytes(b"alpha")
+    (run.dir / "b").write_bytes(b"beta")
+    res = run("sha256 a b")
+    assert res["ok"] and res["stdout"] == (
+        f"{hashlib.sha256(b'alpha').hexdigest()}  a\n{hashlib.sha256(b'beta').hexdigest()}  b"), res
+    res = run("sha256 a nope b")
+    assert not res["ok"] and res["stderr"] == "File not found: nope", res
+    assert res["stdout"].splitlines()[1].endswith("  b")
+
+
+def test_wildcard_skips_symlinks_leaving_the_sandbox(run, tmp_path):
+    import hashlib
+
+    outside = tmp_path / "secret.txt"
+    outside.write_text("secret hit\n")
+    (run.dir / "in.txt").write_text("inside hit\n")
+    (run.dir / "out.txt").symlink_to(outside)
+    res = run("grep hit *.txt")
+    assert res["stdout"] == "1:inside hit", res
+    res = run("sha256 *.txt")
+    assert res["stdout"] == hashlib.sha256(b"inside hit\n").hexdigest() + "  in.txt", res